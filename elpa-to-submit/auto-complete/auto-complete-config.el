@@ -186,12 +186,27 @@
 
 
 (defun ac-ropemacs-documentation (symbol)
-  (ignore-errors (rope-get-documentation symbol))
-  )
+  (let ((id (get-text-property 0 'ac-ropemacs-id symbol)))
+    (and id (ignore-errors (rope-get-proposal-documentation id)))))
+
+(defvar ac-ropemacs-complete nil)
 
 (defun ac-ropemacs-candidates ()
-  (ignore-errors (rope-get-completion-candidates)) 
-  )
+  (let ((proposals (ignore-errors (rope-get-proposals ac-ropemacs-complete))))
+    (when (and (not ac-ropemacs-complete)
+               (ignore-errors (rope-is-completion-partial)))
+      ;; ropemacs-codeassist-deadline left some proposals out
+      (run-with-idle-timer 0 nil 'ac-ropemacs-update-partial
+                           (current-buffer) (point)))
+    (mapcar (lambda (proposal)
+              (propertize (car proposal) 'ac-ropemacs-id (cadr proposal)))
+            proposals)))
+
+(defun ac-ropemacs-update-partial (buffer point)
+  (when (and (eq buffer (current-buffer))
+             (eq point (point)))
+    (let ((ac-ropemacs-complete t))
+      (ac-update t))))
 
 
 
@@ -0,0 +1,59 @@
+"""Compare static object analysis wall time at different worker counts
+
+Usage: python analyze_modules.py [MODULES [WORKERS,...]]
+
+A synthetic project with MODULES modules (3000 by default) is
+created and analyzed as `rope-analyze-modules` does: in the rope
+helper for one worker and with `ropemode.parallel` for more.  Each
+count starts from an empty object DB.
+
+"""
+import sys
+
+import synthetic
+import rope.base.project
+from rope.base import libutils, taskhandle
+
+from ropemode import parallel
+
+
+def serial(project):
+    libutils.analyze_modules(project)
+
+
+def in_workers(project, workers):
+    paths = sorted(r.path for r in project.pycore.get_python_files())
+    results = parallel.imap(parallel.analyze, paths, project.address,
+                            workers, taskhandle.TaskHandle(),
+                            'Analyzing modules')
+    for files in results:
+        parallel.merge_object_info(project, files)
+
+
+def main(argv):
+    modules, worker_counts = synthetic.parse_args(argv)
+    root = synthetic.create_project(modules)
+    try:
+        print '%s modules' % modules
+        for workers in worker_counts:
+            # the rope folder is created here, before the workers open
+            # the project; the object DB is not saved between counts
+            project = rope.base.project.Project(root, save_objectdb=False)
+            if workers == 1:
+                seconds, dummy = synthetic.timed(serial, project)
+            elif parallel.can_analyze(project):
+                seconds, dummy = synthetic.timed(in_workers, project,
+                                                 workers)
+                parallel.shutdown()
+            else:
+                print 'The object DB cannot be merged; skipping workers'
+                break
+            print '%s worker%s: %.2fs' % (workers, 's'[workers == 1:],
+                                           seconds)
+            project.close()
+    finally:
+        synthetic.remove_project(root)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
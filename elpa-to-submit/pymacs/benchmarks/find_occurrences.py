@@ -0,0 +1,62 @@
+"""Compare find occurrences wall time at different worker counts
+
+Usage: python find_occurrences.py [MODULES [WORKERS,...]]
+
+A synthetic project with MODULES modules (3000 by default) is
+created.  The occurrences of ``pkg0.common.target`` are searched in
+the rope helper for one worker and with `ropemode.parallel` for more.
+The first parallel search starts the worker pool; both it and a
+second search are timed.
+
+"""
+import sys
+
+import synthetic
+import rope.base.project
+from rope.base import taskhandle
+from rope.contrib import findit
+
+from ropemode import parallel
+
+
+def serial(project, resource, offset):
+    return len(findit.find_occurrences(project, resource, offset))
+
+
+def in_workers(project, resource, offset, workers):
+    paths = sorted(r.path for r in project.pycore.get_python_files())
+    results = parallel.imap(parallel.find, paths, project.address, workers,
+                            taskhandle.TaskHandle(), 'Find Occurrences',
+                            (findit.find_occurrences, resource.path,
+                             offset, {}))
+    return sum(len(found) for found in results)
+
+
+def main(argv):
+    modules, worker_counts = synthetic.parse_args(argv)
+    root = synthetic.create_project(modules)
+    try:
+        project = rope.base.project.Project(root)
+        resource = project.get_resource('pkg0/common.py')
+        offset = resource.read().index('target')
+        print '%s modules' % modules
+        for workers in worker_counts:
+            if workers == 1:
+                seconds, found = synthetic.timed(serial, project,
+                                                 resource, offset)
+                print '1 worker: %.2fs (%s found)' % (seconds, found)
+                continue
+            cold, found = synthetic.timed(in_workers, project, resource,
+                                          offset, workers)
+            warm, found = synthetic.timed(in_workers, project, resource,
+                                          offset, workers)
+            print '%s workers: %.2fs, %.2fs with a started pool ' \
+                  '(%s found)' % (workers, cold, warm, found)
+            parallel.shutdown()
+        project.close()
+    finally:
+        synthetic.remove_project(root)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,78 @@
+"""Generating synthetic projects for the benchmarks"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'lib'))
+
+
+MODULE = '''\
+from pkg%(package)s import common
+
+
+class Class%(index)s(object):
+
+    def method(self, value):
+        return common.target(value) + %(index)s
+
+
+def function%(index)s(value):
+    instance = Class%(index)s()
+    return instance.method(common.target(value))
+'''
+
+COMMON = '''\
+def target(value):
+    return value * 2
+'''
+
+
+def create_project(modules, packages=10):
+    """Create a project with `modules` modules that call `target()`
+
+    Returns the root folder; the modules are spread over `packages`
+    packages, each with a ``common`` module defining ``target``.
+
+    """
+    root = tempfile.mkdtemp(prefix='rope-benchmark-')
+    for package in range(packages):
+        folder = os.path.join(root, 'pkg%s' % package)
+        os.mkdir(folder)
+        _write(os.path.join(folder, '__init__.py'), '')
+        _write(os.path.join(folder, 'common.py'), COMMON)
+    for index in range(modules):
+        package = index % packages
+        _write(os.path.join(root, 'pkg%s' % package, 'mod%s.py' % index),
+               MODULE % {'package': package, 'index': index})
+    return root
+
+
+def remove_project(root):
+    shutil.rmtree(root)
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def parse_args(argv, modules=3000):
+    """Return the module count and worker counts given on command line"""
+    if len(argv) > 1:
+        modules = int(argv[1])
+    workers = [1, 2, 4, 8]
+    if len(argv) > 2:
+        workers = [int(count) for count in argv[2].split(',')]
+    return modules, workers
+
+
+def _write(path, contents):
+    output = open(path, 'w')
+    try:
+        output.write(contents)
+    finally:
+        output.close()
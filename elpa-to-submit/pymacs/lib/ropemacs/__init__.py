@@ -1,4 +1,6 @@
 """ropemacs, an emacs mode for using rope refactoring library"""
+import os
+
 import ropemode.decorators
 import ropemode.environment
 import ropemode.interface
@@ -31,6 +33,19 @@ class LispUtils(ropemode.environment.Environment):
     def ask_completion(self, prompt, values, starting=None):
         return self.ask_values(prompt, values, starting=starting, exact=None)
 
+    def ask_narrowed(self, prompt, narrow, starting=None):
+        # `narrow` is asked for the matches of the current input as
+        # the user completes; the whole set of values is never sent
+        def collection(text, predicate, action):
+            names = narrow(text)
+            if action is None:
+                return _try_completion(text, names)
+            if action is True:
+                return names
+            if getattr(action, 'text', None) == 'lambda':
+                return text in names
+        return lisp.completing_read(prompt, collection, None, True, starting)
+
     def ask_directory(self, prompt, default=None, starting=None):
         location = starting or default
         if location is not None:
@@ -88,6 +103,12 @@ class LispUtils(ropemode.environment.Environment):
     def is_modified(self):
         return lisp.buffer_modified_p()
 
+    def buffer_tick(self):
+        return lisp.buffer_modified_tick()
+
+    def input_pending(self):
+        return lisp.input_pending_p()
+
     def goto_line(self, lineno):
         lisp.goto_line(lineno)
 
@@ -104,26 +125,29 @@ class LispUtils(ropemode.environment.Environment):
         lisp.delete_region(start, end)
 
     def filenames(self):
-        result = []
-        for buffer in lisp.buffer_list():
-            filename = lisp.buffer_file_name(buffer)
-            if filename:
-                result.append(filename)
-        return result
+        return _copy(lisp('(delq nil (mapcar (quote buffer-file-name) '
+                          '(buffer-list)))'))
 
     def save_files(self, filenames):
-        ask = self.get('confirm_saving')
-        initial = lisp.current_buffer()
-        for filename in filenames:
-            buffer = lisp.find_buffer_visiting(filename)
-            if buffer:
-                if lisp.buffer_modified_p(buffer):
-                    if not ask or lisp.y_or_n_p('Save %s buffer?' % filename):
-                        lisp.set_buffer(buffer)
-                        lisp.save_buffer()
-        lisp.set_buffer(initial)
-
-    def reload_files(self, filenames, moves={}):
+        # the filenames are passed as separate arguments since
+        # non-ascii strings inside quoted lists are not decoded
+        return _copy(lisp.ropemacs_save_files(*filenames))
+
+    def reload_files(self, filenames, moves={}, patches={}):
+        patched = [filename for filename in filenames
+                   if filename in patches and filename not in moves]
+        if patched:
+            # the edits are passed as separate arguments since
+            # non-ascii strings inside quoted lists are not decoded
+            args = []
+            for filename in patched:
+                size, edits = patches[filename]
+                args.extend([filename, size, len(edits)])
+                for edit in edits:
+                    args.extend(edit)
+            failed = _copy(lisp.ropemacs_patch_buffers(*args))
+            filenames = [filename for filename in filenames
+                         if filename not in patched or filename in failed]
         if self.filename() in moves:
             initial = None
         else:
@@ -210,18 +234,50 @@ class LispUtils(ropemode.environment.Environment):
         return lisp.prefix_numeric_value(prefix)
 
     def show_occurrences(self, locations):
-        text = ['List of occurrences:', '']
+        text = 'List of occurrences:\n\n'
+        buffer = self._make_buffer('*rope-occurrences*', text, switch=False)
+        lisp.set_buffer(buffer)
+        lisp.toggle_read_only(1)
+        lisp.set(lisp["next-error-function"], lisp.rope_occurrences_next)
+        lisp.local_set_key('\r', lisp.rope_occurrences_goto)
+        lisp.local_set_key('q', lisp.delete_window)
+        self.add_occurrences(locations)
+
+    def add_occurrences(self, locations):
+        if not locations:
+            return
+        text = []
         for location in locations:
             line = '%s : %s   %s %s' % (location.filename, location.lineno,
                                         location.note, location.offset)
             text.append(line)
         text = '\n'.join(text) + '\n'
-        buffer = self._make_buffer('*rope-occurrences*', text, switch=False)
+        initial = lisp.current_buffer()
+        lisp.set_buffer(lisp.get_buffer('*rope-occurrences*'))
+        lisp.toggle_read_only(-1)
+        lisp.goto_char(lisp.point_max())
+        lisp.insert(text)
+        lisp.toggle_read_only(1)
+        lisp.set_buffer(initial)
+        lisp.sit_for(0)
+
+    def show_module_output(self, filename):
+        initial = lisp.current_buffer()
+        self._make_buffer(_output_buffer(filename), '')
+        lisp.local_set_key('q', lisp.bury_buffer)
+        lisp.set_buffer(initial)
+
+    def add_module_output(self, filename, text):
+        buffer = lisp.get_buffer(_output_buffer(filename))
+        if buffer is None:
+            return
+        initial = lisp.current_buffer()
         lisp.set_buffer(buffer)
+        lisp.toggle_read_only(-1)
+        lisp.goto_char(lisp.point_max())
+        lisp.insert(text)
         lisp.toggle_read_only(1)
-        lisp.set(lisp["next-error-function"], lisp.rope_occurrences_next)
-        lisp.local_set_key('\r', lisp.rope_occurrences_goto)
-        lisp.local_set_key('q', lisp.delete_window)
+        lisp.set_buffer(initial)
 
     def show_doc(self, docs, altview=False):
         use_minibuffer = not altview
@@ -237,12 +293,13 @@ class LispUtils(ropemode.environment.Environment):
             docs = '\n'.join(docs.split('\n')[:7])
             self.message(docs)
 
-    def preview_changes(self, diffs):
-        self._make_buffer('*rope-preview*', diffs, switch=True,
-                          modes=['diff'], window='current')
+    def preview_changes(self, preview):
+        lisp.ropemacs_preview(preview.page, preview.diff, preview.page_size,
+                              preview.page_count())
         try:
             return self.yes_or_no('Do the changes? ')
         finally:
+            lisp.ropemacs_preview_close()
             self._hide_buffer('*rope-preview*', delete=False)
 
     def local_command(self, name, callback, key=None, prefix=False):
@@ -289,7 +346,14 @@ class LispUtils(ropemode.environment.Environment):
                    'after_save': 'after-save-hook',
                    'exit': 'kill-emacs-hook'}
         globals()[name] = callback
-        lisp.add_hook(lisp[mapping[hook]], lisp[_lisp_name(name)])
+        if hook == 'idle':
+            lisp.run_with_idle_timer(self.get('idle_delay'), True,
+                                     lisp[_lisp_name(name)])
+        elif hook != 'timer':
+            lisp.add_hook(lisp[mapping[hook]], lisp[_lisp_name(name)])
+
+    def run_timer(self, name, seconds):
+        lisp.run_with_timer(seconds, None, lisp[_lisp_name(name)])
 
     @property
     @utils.saveit
@@ -305,13 +369,22 @@ class LispUtils(ropemode.environment.Environment):
 def _lisp_name(name):
     return 'rope-' + name.replace('_', '-')
 
+def _output_buffer(filename):
+    return '*rope-run: %s*' % os.path.basename(filename)
+
 class _LispProgress(object):
 
     def __init__(self, name):
+        self.name = name
         self.progress = lisp.make_progress_reporter('%s ... ' % name, 0, 100)
 
-    def update(self, percent):
-        lisp.progress_reporter_update(self.progress, percent)
+    def update(self, percent, rate=None):
+        if rate:
+            lisp.progress_reporter_force_update(
+                self.progress, percent,
+                '%s (%.0f/s) ... ' % (self.name, rate))
+        else:
+            lisp.progress_reporter_update(self.progress, percent)
 
     def done(self):
         lisp.progress_reporter_done(self.progress)
@@ -322,8 +395,10 @@ class _OldProgress(object):
         self.name = name
         self.update(0)
 
-    def update(self, percent):
-        if percent != 0:
+    def update(self, percent, rate=None):
+        if rate:
+            message('%s (%.0f/s) ... %s%%%%' % (self.name, rate, percent))
+        elif percent != 0:
             message('%s ... %s%%%%' % (self.name, percent))
         else:
             message('%s ... ' % self.name)
@@ -335,6 +410,27 @@ class _OldProgress(object):
 def message(message):
     lisp.message(message.replace('%', '%%'))
 
+def _copy(lisp_list):
+    # lists are returned as handles; get them in one round trip
+    if lisp_list is None:
+        return []
+    return lisp_list.copy()
+
+def _try_completion(text, names):
+    if not names:
+        return None
+    if names == [text]:
+        return True
+    names = [name for name in names if name.startswith(text)]
+    if not names:
+        # only fuzzy matches; keep the input so they can be listed
+        return text
+    common = names[0]
+    for name in names[1:]:
+        while not name.startswith(common):
+            common = common[:-1]
+    return common
+
 def occurrences_goto():
     if lisp.line_number_at_pos() < 3:
         lisp.forward_line(3 - lisp.line_number_at_pos())
@@ -376,11 +472,173 @@ If non-nil, you have to confirm saving all modified
 python files before refactorings; otherwise they are
 saved automatically.")
 
+(defun ropemacs-save-files (&rest filenames)
+  "Save the modified buffers visiting FILENAMES.
+
+Asks once for all of them if `ropemacs-confirm-saving' is
+non-nil.  Returns the names of the saved files."
+  (let ((modified nil))
+    (dolist (filename filenames)
+      (let ((buffer (find-buffer-visiting filename)))
+        (when (and buffer (buffer-modified-p buffer))
+          (setq modified (cons (cons filename buffer) modified)))))
+    (setq modified (nreverse modified))
+    (when (and modified
+               (or (not ropemacs-confirm-saving)
+                   (y-or-n-p (if (cdr modified)
+                                 (format "Save %d modified buffers? "
+                                         (length modified))
+                               (format "Save %s buffer? "
+                                       (car (car modified)))))))
+      (save-current-buffer
+        (mapcar (lambda (pair)
+                  (set-buffer (cdr pair))
+                  (save-buffer)
+                  (car pair))
+                modified)))))
+
+(defun ropemacs-patch-buffers (&rest patches)
+  "Apply PATCHES to the buffers visiting their files.
+
+For each file PATCHES contains its name, its size before the change,
+the number of edits and START END TEXT for each edit; START and END
+are zero-based offsets in the old text, in increasing order.
+Buffers that are modified or whose size differs are left alone and
+the names of their files are returned."
+  (let ((failed nil))
+    (while patches
+      (let* ((filename (pop patches))
+             (size (pop patches))
+             (count (pop patches))
+             (buffer (find-buffer-visiting filename))
+             (edits nil))
+        (dotimes (i count)
+          (setq edits (cons (list (pop patches) (pop patches) (pop patches))
+                            edits)))
+        (when buffer
+          (with-current-buffer buffer
+            (if (or (buffer-modified-p) (/= (buffer-size) size))
+                (setq failed (cons filename failed))
+              (let ((inhibit-read-only t))
+                (save-excursion
+                  (save-restriction
+                    (widen)
+                    ;; the last edit comes first, so offsets stay valid
+                    (dolist (edit edits)
+                      (goto-char (1+ (nth 0 edit)))
+                      (delete-region (point) (1+ (nth 1 edit)))
+                      (insert (nth 2 edit))))))
+              (set-buffer-modified-p nil)
+              (set-visited-file-modtime))))))
+    failed))
+
+(defvar ropemacs--preview nil
+  "The functions generating the pages and diffs of a preview buffer.")
+(make-variable-buffer-local 'ropemacs--preview)
+
+(defvar ropemacs--preview-page 0
+  "The page shown in a preview buffer.")
+(make-variable-buffer-local 'ropemacs--preview-page)
+
+(defun ropemacs-preview (page diff size count)
+  "Show the first page of a refactoring preview in *rope-preview*.
+
+PAGE returns the text of a page given its number and DIFF returns
+the diff of a change given its index.  Each page holds at most SIZE
+changes and there are COUNT pages."
+  (switch-to-buffer (get-buffer-create "*rope-preview*"))
+  (diff-mode)
+  (buffer-disable-undo)
+  (setq ropemacs--preview (list page diff size count))
+  ;; diff-mode binds RET and TAB for read-only buffers in
+  ;; `minor-mode-overriding-map-alist', which wins over the local map
+  (let ((map (make-sparse-keymap)))
+    (define-key map (kbd "RET") 'ropemacs-preview-toggle)
+    (define-key map (kbd "TAB") 'ropemacs-preview-toggle)
+    (define-key map "]" 'ropemacs-preview-next-page)
+    (define-key map "[" 'ropemacs-preview-previous-page)
+    (push (cons 'buffer-read-only map) minor-mode-overriding-map-alist))
+  (ropemacs--preview-show-page 0))
+
+(defun ropemacs-preview-close ()
+  "Forget the changes shown in *rope-preview* so they can be freed."
+  (let ((buffer (get-buffer "*rope-preview*")))
+    (when buffer
+      (with-current-buffer buffer
+        (setq ropemacs--preview nil)))))
+
+(defun ropemacs--preview-show-page (number)
+  (let ((inhibit-read-only t)
+        (index (* number (nth 2 ropemacs--preview))))
+    (erase-buffer)
+    (insert (funcall (nth 0 ropemacs--preview) number))
+    (goto-char (point-min))
+    (forward-line 2)
+    (while (not (eobp))
+      (put-text-property (line-beginning-position) (line-end-position)
+                         'ropemacs-preview-index index)
+      (setq index (1+ index))
+      (forward-line 1))
+    (setq ropemacs--preview-page number)
+    (setq buffer-read-only t)
+    (set-buffer-modified-p nil)
+    (goto-char (point-min))))
+
+(defun ropemacs-preview-toggle ()
+  "Show or hide the diff of the change at point in a preview."
+  (interactive)
+  (let ((index (get-text-property (line-beginning-position)
+                                  'ropemacs-preview-index))
+        (inhibit-read-only t))
+    (when (and index ropemacs--preview)
+      (save-excursion
+        (forward-line 1)
+        (if (get-text-property (point) 'ropemacs-preview-diff)
+            (delete-region (point) (or (next-single-property-change
+                                        (point) 'ropemacs-preview-diff)
+                                       (point-max)))
+          (insert (propertize (funcall (nth 1 ropemacs--preview) index)
+                              'ropemacs-preview-diff t))))
+      (set-buffer-modified-p nil))))
+
+(defun ropemacs-preview-next-page ()
+  "Show the next page of a preview."
+  (interactive)
+  (if (and ropemacs--preview
+           (< (1+ ropemacs--preview-page) (nth 3 ropemacs--preview)))
+      (ropemacs--preview-show-page (1+ ropemacs--preview-page))
+    (message "Last page")))
+
+(defun ropemacs-preview-previous-page ()
+  "Show the previous page of a preview."
+  (interactive)
+  (if (and ropemacs--preview (> ropemacs--preview-page 0))
+      (ropemacs--preview-show-page (1- ropemacs--preview-page))
+    (message "First page")))
+
 (defcustom ropemacs-codeassist-maxfixes 1
   "The number of errors to fix before code-assist.
 
 How many errors to fix, at most, when proposing code completions.")
 
+(defcustom ropemacs-codeassist-deadline nil
+  "The number of seconds completion popups may spend on proposals.
+
+The names in scope are always proposed.  Ranking them by type, the
+attributes of dotted expressions and autoimport names are added
+only if there is time left.  When something is left out,
+`rope-is-completion-partial' returns non-nil and the complete list
+can be asked for with `rope-get-proposals'.  `rope-code-assist' and
+`rope-lucky-assist' always compute the complete list.  Use nil to
+always compute it.")
+
+(defcustom ropemacs-task-deadline nil
+  "The number of seconds after which long rope tasks are stopped.
+
+Searches and calculating refactoring changes are interrupted when
+they run longer than this; nil means they may run as long as they
+need.  Tasks can always be interrupted using `keyboard-quit'.")
+
 (defcustom ropemacs-separate-doc-buffer t
   "Should `rope-show-doc' use a separate buffer or the minibuffer.")
 (defcustom ropemacs-max-doc-buffer-height 22
@@ -395,6 +653,71 @@ The `rope-generate-autoimport-cache' reads this list and fills its
 cache.")
 (defcustom ropemacs-autoimport-underlineds 'nil
   "If set, autoimport will cache names starting with underlines, too.")
+(defcustom ropemacs-autoimport-max-proposals 100
+  "The maximum number of autoimport names proposed by code-assist.
+
+Use nil to propose every cached name matching the typed prefix.")
+
+(defcustom ropemacs-max-global-name-matches 50
+  "The maximum number of names offered by `rope-jump-to-global'.
+
+Matches are computed by rope as you type, so only this many are
+transferred to Emacs for each input.")
+
+(defcustom ropemacs-enable-identifier-index 'nil
+  "Specifies whether rope should index the identifiers of project files.
+
+The index is kept in the project's rope folder.  Renames and
+searches then analyze only the files that contain the name.")
+
+(defcustom ropemacs-idle-delay 1
+  "The number of idle seconds before ropemacs does deferred work.
+
+Work such as updating the autoimport cache for saved modules is
+postponed until Emacs has been idle this long.")
+
+(defcustom ropemacs-idle-analysis 'nil
+  "Specifies whether rope should analyze modules while Emacs is idle.
+
+Saved modules and the project modules they import are analyzed,
+most recently saved first, until there is input.")
+
+(defcustom ropemacs-speculate-changes t
+  "Specifies whether rope should calculate changes while asking.
+
+If non-nil, the changes of slow refactorings are calculated in the
+background for the answers given so far while the refactoring dialog
+waits for the action to take.  They are used if the answers do not
+change.")
+
+(defcustom ropemacs-max-module-runs 1
+  "The number of modules `rope-run-module-async' runs at the same time.
+
+Modules run after that wait for one of the running modules to exit.")
+
+(defcustom ropemacs-worker-processes nil
+  "The number of processes used by parallel rope tasks.
+
+`rope-generate-autoimport-cache', `rope-analyze-modules',
+`rope-find-occurrences' and `rope-find-implementations' spread their
+work over this many processes.  Use nil to use one process per CPU
+and 1 to do all the work in the Pymacs helper.")
+
+(defcustom ropemacs-track-changes t
+  "Specifies whether rope should track the files changed outside it.
+
+If non-nil and pyinotify is installed, commands check only the files
+and folders inotify reported as changed since the previous command
+instead of the whole project.  See `ropemacs-poll-changes' for
+tracking changes without pyinotify.")
+
+(defcustom ropemacs-poll-changes 'nil
+  "Specifies whether changes are tracked by polling without pyinotify.
+
+If non-nil and `ropemacs-track-changes' is set but pyinotify is not
+installed, the modification times of project files are compared on
+each command.  That stats every file of the project, which is slower
+than letting rope check the project for most projects.")
 
 (defcustom ropemacs-completing-read-function (if (and (boundp 'ido-mode)
                                                       ido-mode)
@@ -496,6 +819,15 @@ If non-nil, ropemacs tries to guess and open the project that contains
 a file on which the rope command is performed when no project is
 already opened.")
 
+(defcustom ropemacs-max-open-projects 1
+  "The number of rope projects kept open at the same time.
+
+If more than 1, opening a project keeps the current one open and
+commands use the open project that contains the file they are
+performed on; if `ropemacs-guess-project' is non-nil, the project of
+a file outside all of them is opened, too.  The least recently used
+project is closed when there are too many.")
+
 (provide 'ropemacs)
 """
 
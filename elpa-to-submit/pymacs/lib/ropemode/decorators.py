@@ -51,6 +51,9 @@ def _exception_handler(func):
     def newfunc(*args, **kwds):
         try:
             return func(*args, **kwds)
+        except exceptions.InterruptedTaskError:
+            # `refactor.RunTask` has already told the user
+            pass
         except exceptions.RopeError, e:
             short = None
             if isinstance(e, input_exceptions):
@@ -31,7 +31,16 @@ class Boolean(Data):
         return False
 
 
-def show_dialog(askdata, actions, confs={}, optionals={}, initial_asking=True):
+def show_dialog(askdata, actions, confs={}, optionals={}, initial_asking=True,
+                answered=None, decode=True):
+    """Ask for `confs` and `optionals` and the action to take
+
+    If `answered` is given, it is called with the answers and a
+    function returning their decoded values whenever the action is
+    asked for.  If `decode` is false, the answers are returned instead
+    of their values; see `decode()`.
+
+    """
     result = {}
     if initial_asking:
         for name, conf in confs.items():
@@ -44,6 +53,9 @@ def show_dialog(askdata, actions, confs={}, optionals={}, initial_asking=True):
                          default=actions[0], values=names)
     batchset_question = Data('Batch sets: ')
     while True:
+        if answered is not None:
+            answers = dict(result)
+            answered(answers, lambda: _decode(answers, confs, optionals))
         response = askdata(base_question)
         if response == '':
             response = base_question.default
@@ -64,6 +76,17 @@ def show_dialog(askdata, actions, confs={}, optionals={}, initial_asking=True):
                 conf = optionals[response]
             oldvalue = result.get(response, None)
             result[response] = askdata(conf, starting=oldvalue)
+    if not decode:
+        return response, result
+    return response, _decode(result, confs, optionals)
+
+
+def decode(answers, confs={}, optionals={}):
+    """Return the values of the `answers` returned by `show_dialog()`"""
+    return _decode(answers, confs, optionals)
+
+
+def _decode(result, confs, optionals):
     decoded = {}
     all_confs = dict(confs)
     all_confs.update(optionals)
@@ -73,7 +96,7 @@ def show_dialog(askdata, actions, confs={}, optionals={}, initial_asking=True):
             decoded[key] = conf.decode(result[key])
         else:
             decoded[key] = conf.decode(conf.default)
-    return response, decoded
+    return decoded
 
 
 def _parse_batchset(sets):
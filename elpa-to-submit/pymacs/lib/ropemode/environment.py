@@ -12,6 +12,9 @@ class Environment(object):
     def ask_completion(self, prompt, values, starting=None):
         pass
 
+    def ask_narrowed(self, prompt, narrow, starting=None):
+        pass
+
     def message(self, message):
         pass
 
@@ -39,6 +42,12 @@ class Environment(object):
     def is_modified(self):
         pass
 
+    def buffer_tick(self):
+        pass
+
+    def input_pending(self):
+        pass
+
     def goto_line(self, lineno):
         pass
 
@@ -57,7 +66,7 @@ class Environment(object):
     def save_files(self, filenames):
         pass
 
-    def reload_files(self, filenames, moves={}):
+    def reload_files(self, filenames, moves={}, patches={}):
         pass
 
     def find_file(self, filename, readonly=False, other=False):
@@ -78,10 +87,19 @@ class Environment(object):
     def show_occurrences(self, locations):
         pass
 
+    def add_occurrences(self, locations):
+        pass
+
+    def show_module_output(self, filename):
+        pass
+
+    def add_module_output(self, filename, text):
+        pass
+
     def show_doc(self, docs, altview=False):
         pass
 
-    def preview_changes(self, diffs):
+    def preview_changes(self, preview):
         pass
 
     def local_command(self, name, callback, key=None, prefix=False):
@@ -92,3 +110,6 @@ class Environment(object):
 
     def add_hook(self, name, callback, hook):
         pass
+
+    def run_timer(self, name, seconds):
+        pass
@@ -1,4 +1,6 @@
-from rope.base import exceptions
+import weakref
+
+from rope.base import exceptions, resourceobserver
 
 
 def resources(project, rules):
@@ -10,7 +12,14 @@ def resources(project, rules):
     exclusion.
 
     """
-    all = set(project.pycore.get_python_files())
+    tree = _get_tree(project)
+    if rules not in tree.matches:
+        tree.matches[rules] = _resources(project, tree, rules)
+    return set(tree.matches[rules])
+
+
+def _resources(project, tree, rules):
+    all = tree.all
     files = None
     for line in rules.splitlines():
         if not line.strip():
@@ -23,7 +32,7 @@ def resources(project, rules):
         except exceptions.ResourceNotFoundError:
             continue
         if resource.is_folder():
-            matches = set(filter(lambda item: resource.contains(item), all))
+            matches = tree.children(resource)
         else:
             matches = set([resource])
         if first == '+':
@@ -37,3 +46,75 @@ def resources(project, rules):
     if files is None:
         return all
     return files
+
+
+_trees = weakref.WeakKeyDictionary()
+
+def _get_tree(project):
+    tree = _trees.get(project)
+    if tree is None:
+        tree = _trees[project] = _PathTree(project)
+    return tree
+
+
+class _PathTree(object):
+    """The python files of a project arranged by folder
+
+    It is rebuilt lazily whenever rope reports a change in the
+    project's files; `matches` memoizes the result of each rule set
+    until then.  It refers to the project weakly; the project's
+    observer refers to the tree, so a strong reference would keep
+    the project alive as a key of `_trees`.
+
+    """
+
+    def __init__(self, project):
+        self.project = weakref.ref(project)
+        self.root = None
+        self._all = None
+        self.matches = {}
+        observer = resourceobserver.ResourceObserver(
+            changed=self._invalidate, moved=self._invalidate,
+            created=self._invalidate, removed=self._invalidate,
+            validate=self._invalidate)
+        project.add_observer(observer)
+
+    @property
+    def all(self):
+        self._build()
+        return self._all
+
+    def children(self, folder):
+        self._build()
+        node = self.root
+        for part in folder.path.split('/'):
+            if part:
+                node = node[0].get(part)
+                if node is None:
+                    return set()
+        result = set()
+        nodes = [node]
+        while nodes:
+            folders, files = nodes.pop()
+            result.update(files)
+            nodes.extend(folders.values())
+        return result
+
+    def _build(self):
+        if self.root is not None:
+            return
+        self._all = set(self.project().pycore.get_python_files())
+        self.root = ({}, [])
+        for resource in self._all:
+            node = self.root
+            for part in resource.path.split('/')[:-1]:
+                node = node[0].setdefault(part, ({}, []))
+            node[1].append(resource)
+
+    def _invalidate(self, resource, new_resource=None):
+        if resource.is_folder() or new_resource is not None or \
+           not resource.exists() or self._all is None or \
+           resource not in self._all:
+            self.root = None
+            self._all = None
+            self.matches.clear()
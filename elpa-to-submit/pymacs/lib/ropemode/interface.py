@@ -1,11 +1,15 @@
 import os
+import time
 import cStringIO
+import difflib
+from collections import OrderedDict
 
 import rope.base.change
-from rope.base import libutils
+from rope.base import libutils, resourceobserver, taskhandle, worder
 from rope.contrib import codeassist, generate, autoimport, findit
 
-from ropemode import refactor, decorators, dialog
+from ropemode import (refactor, decorators, dialog, nameindex, parallel,
+                      textindex, tracker, scheduler, runner)
 
 
 class RopeMode(object):
@@ -17,6 +21,20 @@ class RopeMode(object):
 
         self._prepare_refactorings()
         self.autoimport = None
+        self.name_index = None
+        self.autoimport_updates = None
+        self.identifiers = None
+        self.change_tracker = None
+        self.change_reports = None
+        self.analysis = None
+        self._resource_cache = None
+        self.projects = OrderedDict()
+        self.module_runs = runner.ModuleRuns(self._show_module_output)
+        self.speculation = None
+        self._polling_runs = False
+        self._partial_completion = False
+        self._completion_cache = _CompletionCache()
+        self._proposal_docs = _ProposalDocs()
         self._init_mode()
 
     def init(self):
@@ -59,7 +77,11 @@ class RopeMode(object):
     @decorators.rope_hook('before_save')
     def before_save_actions(self):
         if self.project is not None:
-            if not self._is_python_file(self.env.filename()):
+            # the changes being calculated would overwrite this save
+            self._stop_speculation()
+            filename = self.env.filename()
+            if not self._is_python_file(filename) or \
+               filename in self.change_reports:
                 return
             resource = self._get_resource()
             if resource.exists():
@@ -70,27 +92,81 @@ class RopeMode(object):
     @decorators.rope_hook('after_save')
     def after_save_actions(self):
         if self.project is not None and self.old_content is not None:
-            libutils.report_change(self.project, self.env.filename(),
-                                   self.old_content)
+            self.change_reports.add(self.env.filename(), self.old_content)
             self.old_content = None
+            if self.analysis is not None:
+                self.analysis.edited(self._get_resource())
+
+    @decorators.rope_hook('idle')
+    def idle_actions(self):
+        if self.speculation is not None:
+            return
+        if self.change_reports is not None:
+            self.change_reports.flush()
+        if self.autoimport_updates is not None:
+            self.autoimport_updates.flush()
+        if self.analysis is not None:
+            self.analysis.run(self.env.input_pending)
+
+    @decorators.rope_hook('timer')
+    def poll_module_runs(self):
+        self._polling_runs = False
+        if self.speculation is not None or self.module_runs.poll():
+            self._poll_module_runs_later()
+
+    def _poll_module_runs_later(self):
+        if not self._polling_runs:
+            self._polling_runs = True
+            self.env.run_timer('poll_module_runs', 0.5)
 
     @decorators.rope_hook('exit')
     def exiting_actions(self):
+        self.module_runs.stop()
         if self.project is not None:
             self.close_project()
+        while self.projects:
+            self._activate(self.projects.popitem(last=False)[1])
+            self.close_project()
 
     @decorators.global_command('o')
     def open_project(self, root=None):
         if not root:
             root = self.env.ask_directory('Rope project root folder: ')
+        root = os.path.realpath(os.path.abspath(os.path.expanduser(root)))
         if self.project is not None:
+            if self.project.address != root and \
+               self._max_open_projects() > 1:
+                self.projects[self.project.address] = self._deactivate()
+            else:
+                self.close_project()
+        if root in self.projects:
+            self._activate(self.projects.pop(root))
+            return
+        while self.projects and \
+              len(self.projects) >= self._max_open_projects():
+            # closing syncs the least recently used project to disk
+            self._activate(self.projects.popitem(last=False)[1])
             self.close_project()
         progress = self.env.create_progress('Opening [%s] project' % root)
         self.project = rope.base.project.Project(root)
+        self._resource_cache = _ResourceCache(self.project)
+        self.change_reports = _ChangeReports(self.project)
         if self.env.get('enable_autoimport'):
             underlined = self.env.get('autoimport_underlineds')
             self.autoimport = autoimport.AutoImport(self.project,
+                                                    observe=False,
                                                     underlined=underlined)
+            self.name_index = nameindex.NameIndex(self.autoimport)
+            self.name_index.refresh()
+            self.autoimport_updates = nameindex.UpdateQueue(
+                self.project, self.autoimport, self.name_index)
+        if self.env.get('enable_identifier_index'):
+            self.identifiers = textindex.IdentifierIndex(self.project)
+        if self.env.get('track_changes'):
+            self.change_tracker = tracker.create_tracker(
+                self.project, poll=self.env.get('poll_changes'))
+        if self.env.get('idle_analysis'):
+            self.analysis = scheduler.AnalysisScheduler(self.project)
         progress.done()
 
     @decorators.global_command('k')
@@ -98,8 +174,23 @@ class RopeMode(object):
         if self.project is not None:
             progress = self.env.create_progress('Closing [%s] project' %
                                                 self.project.address)
+            self.change_reports.flush()
+            self.change_reports = None
+            if self.autoimport_updates is not None:
+                self.autoimport_updates.flush()
+                self.autoimport_updates = None
+            parallel.shutdown(self.project.address)
+            self.module_runs.stop(self.project)
+            self.identifiers = None
+            self.analysis = None
+            if self.change_tracker is not None:
+                self.change_tracker.close()
+                self.change_tracker = None
+            self._resource_cache = None
             self.project.close()
             self.project = None
+            self._completion_cache.clear()
+            self._proposal_docs.clear()
             progress.done()
 
     @decorators.global_command()
@@ -182,7 +273,7 @@ class RopeMode(object):
             return self._get_resource().read()
         return self.env.get_text()
 
-    def _base_findit(self, do_find, optionals, get_kwds):
+    def _base_findit(self, do_find, optionals, get_kwds, batch_size=20):
         self._check_project()
         self._save_buffers()
         resource, offset = self._get_location()
@@ -194,11 +285,44 @@ class RopeMode(object):
             def calculate(handle):
                 resources = refactor._resources(self.project,
                                                 values.get('resources'))
-                return do_find(self.project, resource, offset,
-                               resources=resources, task_handle=handle, **kwds)
-            result = refactor.runtask(self.env, calculate, 'Find Occurrences')
-            locations = [Location(location) for location in result]
-            self.env.show_occurrences(locations)
+                if self.identifiers is not None:
+                    resources = self.identifiers.resources(
+                        worder.get_name_at(resource, offset), resources)
+                if resources is None:
+                    resources = self.project.pycore.get_python_files()
+                resources = list(resources)
+                if workers > 1 and len(resources) > batch_size:
+                    find_parallel(handle, resources)
+                    return
+                # searching in batches lets us show the occurrences
+                # found so far instead of waiting for the whole search
+                batches = [resources[i:i + batch_size]
+                           for i in range(0, len(resources), batch_size)]
+                job_set = handle.create_jobset('Find Occurrences',
+                                               len(batches))
+                self.env.show_occurrences([])
+                for batch in batches:
+                    job_set.started_job(batch[0].path)
+                    result = do_find(self.project, resource, offset,
+                                     resources=batch,
+                                     task_handle=taskhandle.NullTaskHandle(),
+                                     **kwds)
+                    self.env.add_occurrences(
+                        [Location(location) for location in result])
+                    job_set.finished_job()
+            def find_parallel(handle, resources):
+                paths = sorted(resource.path for resource in resources)
+                self.env.show_occurrences([])
+                results = parallel.imap(
+                    parallel.find, paths, self.project.address, workers,
+                    handle, 'Find Occurrences',
+                    (do_find, resource.path, offset, kwds))
+                for found in results:
+                    self.env.add_occurrences(
+                        [Location(parallel.FoundLocation(self.project, *args))
+                         for args in found])
+            workers = self._worker_count()
+            refactor.runtask(self.env, calculate, 'Find Occurrences')
 
     @decorators.local_command('a f', shortcut='C-c f')
     def find_occurrences(self):
@@ -230,11 +354,72 @@ class RopeMode(object):
         _CodeAssist(self, self.env).lucky_assist(prefix)
 
     @decorators.local_command()
-    def get_completion_candidates(self):
-        return _CodeAssist(self, self.env)._calculate_proposals()
+    def get_completion_candidates(self, complete=None):
+        return [name for name, proposal in self._get_proposals(complete)]
+
+    @decorators.local_command()
+    def get_proposals(self, complete=None):
+        """Return completion candidates as (name, proposal ID) pairs
+
+        The ID can be passed to `get_proposal_documentation`; it is nil
+        for names that have no documentation.  Unless `complete` is
+        non-nil, the candidates are limited by `codeassist_deadline`;
+        see `is_completion_partial`.
+
+        """
+        result = []
+        for name, proposal in self._get_proposals(complete):
+            pid = None
+            if proposal is not None:
+                pid = self._proposal_docs.register(proposal)
+            result.append([name, pid])
+        return result
+
+    @decorators.local_command()
+    def get_proposal_documentation(self, pid):
+        self._stop_speculation()
+        return self._proposal_docs.get_doc(pid)
+
+    def _get_proposals(self, complete=None):
+        deadline = None
+        if not complete:
+            deadline = self.env.get('codeassist_deadline')
+        assist = _CodeAssist(self, self.env, deadline)
+        proposals = assist._cached_proposals(self._completion_cache)
+        self._partial_completion = assist.partial
+        return proposals
+
+    @decorators.local_command()
+    def is_completion_partial(self):
+        """Was the last candidate list cut short by `codeassist_deadline`
+
+        The frontend should ask for the complete list when it is.
+
+        """
+        return self._partial_completion
+
+    @decorators.global_command()
+    def cache_stats(self):
+        cache = self._completion_cache
+        stats = 'Completion cache: %s hits, %s narrowed, %s misses' % \
+                (cache.hits, cache.narrowed, cache.misses)
+        if self._resource_cache is not None:
+            cache = self._resource_cache
+            stats += '; resource cache: %s hits, %s misses' % \
+                     (cache.hits, cache.misses)
+        self.env.message(stats)
+
+    @decorators.global_command()
+    def task_stats(self):
+        stats = []
+        for name, seconds, items in refactor.task_log:
+            stats.append('%s: %.1f seconds, %s items (%.1f/s)' %
+                         (name, seconds, items, items / max(seconds, 0.001)))
+        self.env.message('\n'.join(stats) or 'No tasks have run')
 
     @decorators.local_command()
     def get_documentation(self,name):
+        self._stop_speculation()
         return _CodeAssist(self, self.env).get_documentation(name)
     
     @decorators.local_command()
@@ -261,10 +446,27 @@ class RopeMode(object):
                 if not isinstance(modname, basestring):
                     modname = modname.value()
                 modnames.append(modname)
+        workers = self._worker_count()
         def generate(handle):
-            self.autoimport.generate_cache(task_handle=handle)
-            self.autoimport.generate_modules_cache(modules, task_handle=handle)
-        refactor.runtask(self.env, generate, 'Generate autoimport cache')
+            if workers <= 1:
+                self.autoimport.generate_cache(task_handle=handle)
+                self.autoimport.generate_modules_cache(modnames,
+                                                       task_handle=handle)
+                return
+            items = [('resource', resource.path) for resource
+                     in self.project.pycore.get_python_files()]
+            items.extend(('module', modname) for modname in modnames)
+            results = parallel.imap(
+                parallel.autoimport_names, items, self.project.address,
+                workers, handle, 'Generating autoimport cache',
+                (self.autoimport.underlined,))
+            for names in results:
+                self.autoimport.names.update(names)
+        try:
+            refactor.runtask(self.env, generate, 'Generate autoimport cache')
+        finally:
+            # an interrupted generation leaves part of the cache changed
+            self.name_index.invalidate()
 
     @decorators.global_command('f', 'P')
     def find_file(self, prefix):
@@ -301,8 +503,10 @@ class RopeMode(object):
     def jump_to_global(self):
         if not self._check_autoimport():
             return
-        all_names = list(self.autoimport.get_all_names())
-        name = self.env.ask_values('Global name: ', all_names)
+        limit = self.env.get('max_global_name_matches', 50)
+        def narrow(text):
+            return self.name_index.matching(text, limit)
+        name = self.env.ask_narrowed('Global name: ', narrow)
         result = dict(self.autoimport.get_name_locations(name))
         if len(result) == 1:
             resource = list(result.keys())[0]
@@ -356,9 +560,22 @@ class RopeMode(object):
     def analyze_modules(self):
         """Perform static object analysis on all project modules"""
         self._check_project()
-        def _analyze_modules(handle):
+        workers = self._worker_count()
+        def analyze_serial(handle):
             libutils.analyze_modules(self.project, task_handle=handle)
-        refactor.runtask(self.env, _analyze_modules, 'Analyze project modules')
+        def analyze_parallel(handle):
+            paths = sorted(resource.path for resource
+                           in self.project.pycore.get_python_files())
+            results = parallel.imap(parallel.analyze, paths,
+                                    self.project.address, workers, handle,
+                                    'Analyzing modules')
+            for files in results:
+                parallel.merge_object_info(self.project, files)
+            self.project.pycore.module_cache.forget_all_data()
+        in_workers = workers > 1 and parallel.can_analyze(self.project)
+        refactor.runtask(self.env,
+                         analyze_parallel if in_workers else analyze_serial,
+                         'Analyze project modules')
 
     @decorators.local_command()
     def run_module(self):
@@ -371,6 +588,23 @@ class RopeMode(object):
         finally:
             process.kill_process()
 
+    @decorators.local_command()
+    def run_module_async(self):
+        """Run this module in the background and perform DOA on it
+
+        The output of the module is shown as it runs.  The information
+        collected by dynamic object analysis is applied when it exits.
+        """
+        self._check_project()
+        resource = self._get_resource()
+        self.module_runs.limit = self.env.get('max_module_runs') or 1
+        self.env.show_module_output(resource.real_path)
+        self.module_runs.run(self.project, resource)
+        self._poll_module_runs_later()
+
+    def _show_module_output(self, resource, text):
+        self.env.add_module_output(resource.real_path, text)
+
     def _create(self, name, callback, parentname='source'):
         self._check_project()
         confs = {'name': dialog.Data(name.title() + ' name: ')}
@@ -404,18 +638,73 @@ class RopeMode(object):
             filename = self.env.filename()
         if filename is None:
             return
+        if self._resource_cache is not None:
+            return self._resource_cache.get(filename)
         resource = libutils.path_to_resource(self.project, filename, 'file')
         return resource
 
+    def _worker_count(self):
+        return parallel.worker_count(self.env.get('worker_processes'))
+
+    _project_state = ('project', 'autoimport', 'name_index',
+                      'autoimport_updates', 'identifiers', 'change_tracker',
+                      'change_reports', 'analysis', '_resource_cache')
+
+    def _deactivate(self):
+        state = dict((name, getattr(self, name))
+                     for name in self._project_state)
+        for name in self._project_state:
+            setattr(self, name, None)
+        return state
+
+    def _activate(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _max_open_projects(self):
+        return max(1, self.env.get('max_open_projects') or 1)
+
+    def _stop_speculation(self):
+        # rope is not thread-safe, so the changes being calculated in
+        # the background are dropped before anything else uses it
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+
     def _check_project(self):
+        self._stop_speculation()
+        if self.project is None or not self._in_project(self.project):
+            root = self._find_project()
+            if root is not None:
+                self.open_project(root)
         if self.project is None:
             if self.env.get('guess_project'):
                 self.open_project(self._guess_project())
             else:
                 self.open_project()
+        elif self.change_tracker is not None:
+            self.change_tracker.validate()
         else:
             self.project.validate(self.project.root)
 
+    def _in_project(self, project):
+        filename = self.env.filename()
+        return filename is None or os.path.realpath(filename).startswith(
+            os.path.join(project.address, ''))
+
+    def _find_project(self):
+        """Return the root of an open project for the current buffer"""
+        filename = self.env.filename()
+        if filename is None:
+            return None
+        roots = [root for root, state in self.projects.items()
+                 if self._in_project(state['project'])]
+        if roots:
+            return max(roots, key=len)
+        if self.env.get('guess_project') and \
+           self._max_open_projects() > 1:
+            return self._guess_project()
+
     def _guess_project(self):
         cwd = self.env.filename()
         if cwd is not None:
@@ -431,13 +720,33 @@ class RopeMode(object):
     def _reload_buffers(self, changes, undo=False):
         self._reload_buffers_for_changes(
             changes.get_changed_resources(),
-            self._get_moved_resources(changes, undo))
+            self._get_moved_resources(changes, undo),
+            self._get_patches(changes, undo))
 
-    def _reload_buffers_for_changes(self, changed, moved={}):
+    def _reload_buffers_for_changes(self, changed, moved={}, patches={}):
         filenames = [resource.real_path for resource in changed]
         moved = dict([(resource.real_path, moved[resource].real_path)
                       for resource in moved])
-        self.env.reload_files(filenames, moved)
+        self.env.reload_files(filenames, moved, patches)
+
+    def _get_patches(self, changes, undo=False):
+        """Return the edits turning old contents of files into new ones
+
+        The result maps file names to ``(old_size, edits)`` where edits
+        are ``(start, end, text)`` replacements in increasing order.
+
+        """
+        result = {}
+        if isinstance(changes, rope.base.change.ChangeSet):
+            for change in changes.changes:
+                result.update(self._get_patches(change, undo))
+        if isinstance(changes, rope.base.change.ChangeContents) and \
+           changes.old_contents is not None:
+            old, new = changes.old_contents, changes.new_contents
+            if undo:
+                old, new = new, old
+            result[changes.resource.real_path] = (len(old), _edits(old, new))
+        return result
 
     def _get_moved_resources(self, changes, undo=False):
         result = {}
@@ -462,10 +771,9 @@ class RopeMode(object):
         self.env.save_files(pythons)
 
     def _is_python_file(self, path):
-        resource = self._get_resource(path)
-        return (resource is not None and
-                resource.project == self.project and
-                self.project.pycore.is_python_file(resource))
+        if path is not None and self._resource_cache is not None:
+            return self._resource_cache.is_python_file(path)
+        return _is_python_file(self.project, self._get_resource(path))
 
     def _askdata(self, data, starting=None):
         ask_func = self.env.ask
@@ -479,6 +787,91 @@ class RopeMode(object):
         return ask_func(**ask_args)
 
 
+def _edits(old, new):
+    old_lines = old.splitlines(True)
+    new_lines = new.splitlines(True)
+    starts = [0]
+    for line in old_lines:
+        starts.append(starts[-1] + len(line))
+    result = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            result.append((starts[i1], starts[i2], ''.join(new_lines[j1:j2])))
+    return result
+
+
+def _is_python_file(project, resource):
+    return (resource is not None and
+            resource.project == project and
+            project.pycore.is_python_file(resource))
+
+
+class _ChangeReports(object):
+    """Saved files whose changes are reported to rope when Emacs is idle
+
+    Reporting a change runs automatic SOA on the changed scopes, which
+    can take a while for large modules.  A file saved again before its
+    change is reported keeps the contents it had before the first save.
+
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.pending = OrderedDict()
+
+    def __contains__(self, filename):
+        return filename in self.pending
+
+    def add(self, filename, old_content):
+        self.pending.setdefault(filename, old_content)
+
+    def flush(self):
+        while self.pending:
+            filename, old_content = self.pending.popitem(last=False)
+            if os.path.exists(filename):
+                libutils.report_change(self.project, filename, old_content)
+
+
+class _ResourceCache(object):
+    """The resources of the paths commands were run on
+
+    Resolving a path to a resource computes the real paths of the file
+    and of the project, so the results are kept until rope reports a
+    file created, moved or removed.
+
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.resources = {}
+        self.pythons = {}
+        self.hits = 0
+        self.misses = 0
+        observer = resourceobserver.ResourceObserver(
+            moved=self._clear, created=self._clear, removed=self._clear)
+        project.add_observer(observer)
+
+    def get(self, path):
+        resource = self.resources.get(path)
+        if resource is None:
+            self.misses += 1
+            resource = libutils.path_to_resource(self.project, path, 'file')
+            self.resources[path] = resource
+        else:
+            self.hits += 1
+        return resource
+
+    def is_python_file(self, path):
+        if path not in self.pythons:
+            self.pythons[path] = _is_python_file(self.project, self.get(path))
+        return self.pythons[path]
+
+    def _clear(self, resource, new_resource=None):
+        self.resources.clear()
+        self.pythons.clear()
+
+
 class Location(object):
     def __init__(self, location):
         self.location = location
@@ -497,15 +890,18 @@ class Location(object):
 
 class _CodeAssist(object):
 
-    def __init__(self, interface, env):
+    def __init__(self, interface, env, deadline=None):
         self.interface = interface
         self.autoimport = interface.autoimport
         self.env = env
+        self.deadline = deadline
         self._source = None
         self._offset = None
         self._starting_offset = None
         self._starting = None
         self._expression = None
+        self.partial = False
+        self.truncated = False
 
     def code_assist(self, prefix):
         names = self._calculate_proposals()
@@ -560,19 +956,65 @@ class _CodeAssist(object):
             self.env.insert(assist)
 
     def _calculate_proposals(self):
+        return [name for name, proposal in self._calculate_named_proposals()]
+
+    def _calculate_named_proposals(self):
+        start = time.time()
         self.interface._check_project()
-        resource = self.interface._get_resource()
-        maxfixes = self.env.get('codeassist_maxfixes')
-        proposals = codeassist.code_assist(
-            self.interface.project, self.source, self.offset,
-            resource, maxfixes=maxfixes)
-        proposals = codeassist.sorted_proposals(proposals)
-        names = [proposal.name for proposal in proposals]
+        result = []
+        # scope names are always proposed; the attributes of a dotted
+        # expression and ranking names by type need inferring objects
+        if '.' not in self.expression or self._in_budget(start):
+            resource = self.interface._get_resource()
+            maxfixes = self.env.get('codeassist_maxfixes')
+            proposals = codeassist.code_assist(
+                self.interface.project, self.source, self.offset,
+                resource, maxfixes=maxfixes)
+            if self._in_budget(start):
+                proposals = codeassist.sorted_proposals(proposals)
+            else:
+                proposals = _sorted_by_scope(proposals)
+                self.partial = True
+            result = [(proposal.name, proposal) for proposal in proposals]
+        else:
+            self.partial = True
         if self.autoimport is not None:
             if self.starting.strip() and '.' not in self.expression:
-                import_assists = self.autoimport.import_assist(self.starting)
-                names.extend(x[0] + ' : ' + x[1] for x in import_assists)
-        return names
+                if self._in_budget(start):
+                    limit = self.env.get('autoimport_max_proposals')
+                    import_assists = self.interface.name_index.prefixed(
+                        self.starting, limit)
+                    result.extend((x[0] + ' : ' + x[1], None)
+                                  for x in import_assists)
+                    self.truncated = limit is not None and \
+                                     len(import_assists) >= limit
+                else:
+                    self.partial = True
+        return result
+
+    def _cached_proposals(self, cache):
+        filename = self.env.filename()
+        tick = self.env.buffer_tick()
+        entry = cache.get(filename)
+        if entry is not None and entry.tick == tick and \
+           entry.offset == self.offset and \
+           (not entry.partial or self.deadline):
+            cache.hits += 1
+            self.partial = entry.partial
+            return entry.proposals
+        if entry is not None and entry.can_narrow(self):
+            cache.narrowed += 1
+            self.partial = entry.partial
+            proposals = [(name, proposal) for name, proposal in entry.proposals
+                         if name.startswith(self.starting)]
+        else:
+            cache.misses += 1
+            proposals = self._calculate_named_proposals()
+        cache.put(filename, _CompletionEntry(self, tick, proposals))
+        return proposals
+
+    def _in_budget(self, start):
+        return not self.deadline or time.time() - start < self.deadline
 
     def _insert_import(self, name, module):
         lineno = self.autoimport.find_insertion_line(self.source)
@@ -636,3 +1078,111 @@ class _CodeAssist(object):
             self._expression = codeassist.starting_expression(self.source,
                                                               self.offset)
         return self._expression
+
+
+def _sorted_by_scope(proposals):
+    # like `codeassist.sorted_proposals()` but without the types of
+    # the names, which may need inferring their objects
+    scopes = ['parameter_keyword', 'local', 'global', 'imported',
+              'attribute', 'builtin', 'keyword']
+    def key(proposal):
+        if proposal.scope in scopes:
+            return scopes.index(proposal.scope), proposal.name
+        return len(scopes), proposal.name
+    return sorted(proposals, key=key)
+
+
+class _CompletionCache(object):
+    """The last completion proposals of each buffer
+
+    Proposals are reused while the buffer is unchanged and narrowed
+    while the user only extends the typed prefix.
+
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.narrowed = 0
+        self.misses = 0
+
+    def get(self, filename):
+        return self.entries.get(filename)
+
+    def put(self, filename, entry):
+        self.entries[filename] = entry
+
+    def clear(self):
+        self.entries.clear()
+
+
+class _CompletionEntry(object):
+
+    def __init__(self, assist, tick, proposals):
+        self.tick = tick
+        self.offset = assist.offset
+        self.starting_offset = assist.starting_offset
+        self.starting = assist.starting
+        self.head = assist.source[:assist.starting_offset]
+        self.proposals = proposals
+        self.partial = assist.partial
+        # autoimport names are not proposed for an empty prefix, names
+        # past `autoimport_max_proposals` are missing and partial lists
+        # lack the names left out by the deadline
+        self.narrowable = not assist.truncated and not assist.partial and \
+                          (assist.autoimport is None or
+                           bool(assist.starting.strip()) or
+                           '.' in assist.expression)
+
+    def can_narrow(self, assist):
+        return (self.narrowable and
+                self.starting_offset == assist.starting_offset and
+                assist.starting.startswith(self.starting) and
+                self.head == assist.source[:self.starting_offset])
+
+
+class _ProposalDocs(object):
+    """Documentation of recently proposed completions by ID
+
+    The docs are extracted from rope's proposal objects the first
+    time they are asked for and are kept for the `size` most
+    recently used IDs.
+
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.entries = OrderedDict()
+        self.ids = {}
+        self.counter = 0
+
+    def register(self, proposal):
+        pid = self.ids.get(id(proposal))
+        if pid is not None:
+            self.entries[pid] = self.entries.pop(pid)
+            return pid
+        self.counter += 1
+        pid = self.counter
+        self.entries[pid] = [proposal, None, False]
+        self.ids[id(proposal)] = pid
+        while len(self.entries) > self.size:
+            old_pid, old_entry = self.entries.popitem(last=False)
+            del self.ids[id(old_entry[0])]
+        return pid
+
+    def get_doc(self, pid):
+        entry = self.entries.pop(pid, None)
+        if entry is None:
+            return None
+        self.entries[pid] = entry
+        proposal, doc, extracted = entry
+        if not extracted:
+            if proposal.pyname is not None:
+                doc = codeassist.PyDocExtractor().get_doc(
+                    proposal.pyname.get_object())
+            entry[1:] = [doc, True]
+        return doc
+
+    def clear(self):
+        self.entries.clear()
+        self.ids.clear()
@@ -0,0 +1,149 @@
+import bisect
+import re
+from collections import OrderedDict
+
+from rope.base import resourceobserver
+
+
+class NameIndex(object):
+    """A sorted index over the global names cached by autoimport
+
+    `autoimport.import_assist()` scans every cached name; this index
+    answers prefix queries with a binary search instead.  Call
+    `invalidate()` whenever autoimport's cache might have changed; the
+    next lookup then reindexes only the modules whose names changed.
+
+    """
+
+    def __init__(self, autoimport):
+        self.autoimport = autoimport
+        self.entries = []
+        self.modules = {}
+        self.dirty = True
+
+    def invalidate(self):
+        self.dirty = True
+
+    def prefixed(self, starting, limit=None):
+        """Return ``(name, module)`` pairs of names starting with `starting`"""
+        self.refresh()
+        entries = self.entries
+        index = bisect.bisect_left(entries, (starting,))
+        result = []
+        while index < len(entries) and entries[index][0].startswith(starting):
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(entries[index])
+            index += 1
+        return result
+
+    def matching(self, pattern, limit):
+        """Return at most `limit` distinct names matching `pattern`
+
+        Names starting with `pattern` come first.  They are followed
+        by names that start with the first character of `pattern` and
+        contain the rest of its characters in order.  Only the range of
+        names starting with that character is searched.
+
+        """
+        self.refresh()
+        entries = self.entries
+        result = []
+        seen = set()
+        def add(name):
+            if name not in seen:
+                seen.add(name)
+                result.append(name)
+        index = bisect.bisect_left(entries, (pattern,))
+        while index < len(entries) and len(result) < limit and \
+              entries[index][0].startswith(pattern):
+            add(entries[index][0])
+            index += 1
+        if not pattern:
+            return result
+        regex = re.compile('.*?'.join(re.escape(c) for c in pattern))
+        index = bisect.bisect_left(entries, (pattern[0],))
+        while index < len(entries) and len(result) < limit and \
+              entries[index][0].startswith(pattern[0]):
+            name = entries[index][0]
+            if regex.match(name):
+                add(name)
+            index += 1
+        return result
+
+    def refresh(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        names = self.autoimport.names
+        changed = [module for module in names
+                   if self.modules.get(module) is not names[module]]
+        removed = [module for module in self.modules
+                   if module not in names]
+        if len(changed) + len(removed) > len(self.modules) // 2:
+            self.entries = sorted((name, module) for module in names
+                                  for name in names[module])
+        else:
+            for module in changed + removed:
+                for name in self.modules.get(module, []):
+                    self._remove((name, module))
+            for module in changed:
+                for name in names[module]:
+                    bisect.insort(self.entries, (name, module))
+        self.modules = dict(names)
+
+    def _remove(self, entry):
+        index = bisect.bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+
+
+class UpdateQueue(object):
+    """Queue autoimport updates for changed modules
+
+    It observes the project instead of autoimport itself, so saving a
+    module only records it; `flush()` re-extracts the globals of the
+    queued modules later.  Saving a module repeatedly before that
+    updates it once.
+
+    """
+
+    def __init__(self, project, autoimport, index):
+        self.project = project
+        self.autoimport = autoimport
+        self.index = index
+        self.pending = OrderedDict()
+        observer = resourceobserver.ResourceObserver(
+            changed=self._changed, moved=self._moved, removed=self._removed)
+        project.add_observer(observer)
+
+    def flush(self, limit=None):
+        """Update at most `limit` queued modules and return their count"""
+        count = 0
+        while self.pending and (limit is None or count < limit):
+            resource, dummy = self.pending.popitem(last=False)
+            if resource.exists():
+                self.autoimport.update_resource(resource)
+            count += 1
+        if count:
+            self.index.invalidate()
+        return count
+
+    def _changed(self, resource):
+        if not resource.is_folder():
+            self.pending[resource] = True
+
+    def _moved(self, resource, new_resource):
+        self._removed(resource)
+        self._changed(new_resource)
+
+    def _removed(self, resource):
+        self.pending.pop(resource, None)
+        modname = self.project.pycore.modname(resource)
+        names = self.autoimport.names
+        stale = [module for module in names if module == modname or
+                 (resource.is_folder() and module.startswith(modname + '.'))]
+        for module in stale:
+            del names[module]
+        if stale:
+            self.index.invalidate()
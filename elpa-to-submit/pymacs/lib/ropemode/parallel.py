@@ -0,0 +1,216 @@
+"""Running rope jobs in a pool of worker processes
+
+Each worker opens its own `Project` on the same root and never writes
+it back to disk; the results are merged by the caller.  Each project
+root has its own pool, kept between jobs until `shutdown()`; workers
+validate their project before each chunk, so they see files changed
+since the previous job.
+
+"""
+import multiprocessing
+
+import rope.base.project
+from rope.contrib import autoimport
+try:
+    from rope.base.oi import memorydb
+except ImportError:
+    memorydb = None
+
+
+def worker_count(count=None):
+    if count:
+        return count
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def imap(function, items, root, workers, task_handle, name='Job', args=()):
+    """Call `function(project, chunk, *args)` on chunks of `items`
+
+    The chunks are processed in `workers` processes and the results
+    are yielded in the order of the chunks.  Each finished chunk is
+    reported as a job of `task_handle`; stopping the handle terminates
+    the workers.
+
+    """
+    chunks = _split(items, workers * 4)
+    job_set = task_handle.create_jobset(name, len(chunks))
+    pool = _get_pool(root, workers)
+    finished = False
+    try:
+        results = pool.imap(_call, [(function, chunk, args)
+                                    for chunk in chunks])
+        for index in range(len(chunks)):
+            job_set.started_job('Chunk %s of %s' % (index + 1, len(chunks)))
+            yield _next(results, job_set)
+            job_set.finished_job()
+        finished = True
+    finally:
+        if not finished:
+            shutdown(root)
+
+
+def shutdown(root=None):
+    """Stop the worker processes of `root` or of all roots"""
+    for key in list(_pools):
+        if root in (None, key):
+            _pools.pop(key)[1].terminate()
+
+
+_pools = {}
+
+def _get_pool(root, workers):
+    if root in _pools and _pools[root][0] != workers:
+        shutdown(root)
+    if root not in _pools:
+        pool = multiprocessing.Pool(workers, _open_project, (root,))
+        _pools[root] = (workers, pool)
+    return _pools[root][1]
+
+
+def _split(items, count):
+    items = list(items)
+    size = max(1, -(-len(items) // max(1, count)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _next(results, job_set):
+    # waiting with a timeout keeps the helper responsive to quits
+    while True:
+        try:
+            return results.next(0.2)
+        except multiprocessing.TimeoutError:
+            job_set.check_status()
+
+
+_project = None
+
+def _open_project(root):
+    global _project
+    _project = rope.base.project.Project(root)
+
+def _call(args):
+    function, chunk, extra = args
+    _project.validate(_project.root)
+    return function(_project, chunk, *extra)
+
+
+def autoimport_names(project, items, underlined=None):
+    """Return the global names autoimport would cache for `items`
+
+    `items` contains ``('resource', path)`` and ``('module', name)``
+    pairs.  The result maps module names to lists of names, like
+    `AutoImport.names`.
+
+    """
+    importer = autoimport.AutoImport(project, observe=False,
+                                     underlined=underlined)
+    importer.names = {}
+    resources = [project.get_resource(path)
+                 for kind, path in items if kind == 'resource']
+    modules = [name for kind, name in items if kind == 'module']
+    importer.generate_cache(resources=resources)
+    importer.generate_modules_cache(modules)
+    return importer.names
+
+
+def find(project, paths, do_find, path, offset, kwds):
+    """Run `do_find` (like `findit.find_occurrences`) on `paths`
+
+    Returns ``(path, offset, unsure, lineno)`` tuples; see
+    `FoundLocation`.
+
+    """
+    resources = [project.get_resource(p) for p in paths]
+    result = do_find(project, project.get_resource(path), offset,
+                     resources=resources, **kwds)
+    return [(location.resource.path, location.offset, location.unsure,
+             location.lineno) for location in result]
+
+
+def analyze(project, paths):
+    """Perform static object analysis on `paths`
+
+    The analysis starts with an empty object DB, so the result contains
+    only the information found for these modules.  It maps file paths
+    to scopes, like the memory object DB; see `merge_object_info()`.
+
+    """
+    store = _ObjectInfoStore(project)
+    store.files = {}
+    for path in paths:
+        project.pycore.analyze_module(project.get_resource(path))
+    return store.files
+
+
+def merge_object_info(project, files):
+    """Add the object information returned by `analyze()` to `project`
+
+    Information for a scope is added to what is already known about
+    it; the last merged one wins when both describe the same call or
+    name, so merging the results in a fixed order is deterministic.
+
+    """
+    store = _ObjectInfoStore(project)
+    for path in sorted(files):
+        for key, scope in sorted(files[path].items()):
+            store.merge_scope(path, key, scope)
+
+
+def can_analyze(project):
+    """Can `analyze()` and `merge_object_info()` be used for `project`
+
+    They rely on how rope's memory object DB stores its information;
+    when it does not, modules should be analyzed serially.
+
+    """
+    return _ObjectInfoStore.supports(project)
+
+
+class _ObjectInfoStore(object):
+    # the only code using the internals of `rope.base.oi.memorydb`
+
+    def __init__(self, project):
+        self.db = project.pycore.object_info.objectdb.db
+
+    def _get_files(self):
+        return self.db._files
+
+    def _set_files(self, files):
+        self.db._files = files
+
+    files = property(_get_files, _set_files)
+
+    def merge_scope(self, path, key, scope):
+        scopes = self.files.setdefault(path, {})
+        if key in scopes:
+            scopes[key].call_info.update(scope.call_info)
+            scopes[key].per_name.update(scope.per_name)
+        else:
+            scopes[key] = scope
+
+    @staticmethod
+    def supports(project):
+        if memorydb is None:
+            return False
+        object_info = getattr(project.pycore, 'object_info', None)
+        objectdb = getattr(object_info, 'objectdb', None)
+        db = getattr(objectdb, 'db', None)
+        if not isinstance(db, memorydb.MemoryDB) or \
+           not isinstance(getattr(db, '_files', None), dict):
+            return False
+        scope = memorydb.ScopeInfo()
+        return isinstance(getattr(scope, 'call_info', None), dict) and \
+            isinstance(getattr(scope, 'per_name', None), dict)
+
+
+class FoundLocation(object):
+    """A location found by `find()` in the caller's project"""
+
+    def __init__(self, project, path, offset, unsure, lineno):
+        self.resource = project.get_resource(path)
+        self.offset = offset
+        self.unsure = unsure
+        self.lineno = lineno
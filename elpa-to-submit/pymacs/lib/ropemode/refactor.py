@@ -1,4 +1,9 @@
+import difflib
 import re
+import sys
+import threading
+import time
+from collections import deque
 
 import rope.base.change
 import rope.contrib.generate
@@ -11,7 +16,7 @@ import rope.refactor.move
 import rope.refactor.rename
 import rope.refactor.restructure
 import rope.refactor.usefunction
-from rope.base import taskhandle
+from rope.base import exceptions, taskhandle
 
 from ropemode import dialog, filter
 
@@ -21,6 +26,7 @@ class Refactoring(object):
     confs = {}
     optionals = {}
     saveall = True
+    speculate = False
 
     def __init__(self, interface, env):
         self.interface = interface
@@ -30,23 +36,39 @@ class Refactoring(object):
         self.interface._check_project()
         self.interface._save_buffers(only_current=not self.saveall)
         self._create_refactoring()
-        action, result = dialog.show_dialog(
-            self.interface._askdata, ['perform', 'preview', 'cancel'],
-            self._get_confs(), self._get_optionals(),
-            initial_asking=initial_asking)
-        if action == 'cancel':
-            self.env.message('Cancelled!')
-            return
-        def calculate(handle):
-            return self._calculate_changes(result, handle)
-        name = 'Calculating %s changes' % self.name
-        changes = runtask(self.env, calculate, name=name)
+        confs = self._get_confs()
+        optionals = self._get_optionals()
+        answered = None
+        if self.speculate and self.env.get('speculate_changes'):
+            answered = self._speculate
+        try:
+            action, answers = dialog.show_dialog(
+                self.interface._askdata, ['perform', 'preview', 'cancel'],
+                confs, optionals, initial_asking=initial_asking,
+                answered=answered, decode=False)
+            if action == 'cancel':
+                self.env.message('Cancelled!')
+                return
+            speculation = self.interface.speculation
+            if speculation is not None and speculation.answers != answers:
+                self._speculate(None, None)
+                speculation = None
+            if speculation is None:
+                # decoders may use rope, so not while speculating
+                result = dialog.decode(answers, confs, optionals)
+            def calculate(handle):
+                if speculation is not None:
+                    return speculation.wait(handle)
+                return self._calculate_changes(result, handle)
+            name = 'Calculating %s changes' % self.name
+            changes = runtask(self.env, calculate, name=name)
+        finally:
+            self._speculate(None, None)
         if action == 'perform':
             self._perform(changes)
         if action == 'preview':
             if changes is not None:
-                diffs = str(changes.get_description())
-                if self.env.preview_changes(diffs):
+                if self.env.preview_changes(Preview(changes)):
                     self._perform(changes)
                 else:
                     self.env.message('Thrown away!')
@@ -76,6 +98,21 @@ class Refactoring(object):
     def _calculate_changes(self, option_values, task_handle):
         pass
 
+    def _speculate(self, answers, decode):
+        current = self.interface.speculation
+        if current is not None:
+            if decode is not None and current.answers == answers:
+                return
+            current.cancel()
+            self.interface.speculation = None
+        if decode is not None:
+            try:
+                values = decode()
+            except Exception:
+                return
+            self.interface.speculation = _Speculation(
+                self._calculate_changes, answers, values)
+
     def _create_refactoring(self):
         pass
 
@@ -111,6 +148,7 @@ class Refactoring(object):
 
 class Rename(Refactoring):
     key = 'r'
+    speculate = True
 
     saveall = True
 
@@ -119,6 +157,10 @@ class Rename(Refactoring):
             self.project, self.resource, self.offset)
 
     def _calculate_changes(self, values, task_handle):
+        identifiers = self.interface.identifiers
+        if identifiers is not None:
+            values['resources'] = identifiers.resources(
+                self.renamer.get_old_name(), values.get('resources'))
         return self.renamer.get_changes(task_handle=task_handle, **values)
 
     def _get_optionals(self):
@@ -150,6 +192,7 @@ class RenameCurrentModule(Rename):
 
 class Restructure(Refactoring):
     key = 'x'
+    speculate = True
     confs = {'pattern': dialog.Data('Restructuring pattern: '),
              'goal': dialog.Data('Restructuring goal: ')}
 
@@ -182,6 +225,7 @@ class Restructure(Refactoring):
 
 class UseFunction(Refactoring):
     key = 'u'
+    speculate = True
 
     def _create_refactoring(self):
         self.user = rope.refactor.usefunction.UseFunction(
@@ -196,6 +240,7 @@ class UseFunction(Refactoring):
 
 class Move(Refactoring):
     key = 'v'
+    speculate = True
 
     def _create_refactoring(self):
         self.mover = rope.refactor.move.create_move(self.project,
@@ -259,6 +304,7 @@ class ModuleToPackage(Refactoring):
 
 class Inline(Refactoring):
     key = 'i'
+    speculate = True
 
     def _create_refactoring(self):
         self.inliner = rope.refactor.inline.create_inline(
@@ -340,6 +386,7 @@ class MethodObject(Refactoring):
 
 class IntroduceFactory(Refactoring):
     saveall = True
+    speculate = True
     key = 'f'
 
     def _create_refactoring(self):
@@ -360,6 +407,7 @@ class IntroduceFactory(Refactoring):
 
 class ChangeSignature(Refactoring):
     saveall = True
+    speculate = True
     key = 's'
 
     def _create_refactoring(self):
@@ -465,27 +513,202 @@ def _resources(project, text):
     return filter.resources(project, text)
 
 
-def runtask(env, command, name, interrupts=True):
-    return RunTask(env, command, name, interrupts)()
+class Preview(object):
+    """The changes of a refactoring, described a page at a time
+
+    A page lists changed files with the number of their hunks; the
+    diff of a file is generated only when it is asked for.
+
+    """
+
+    page_size = 50
+
+    def __init__(self, changes):
+        self.description = ' '.join(str(changes.description).split())
+        self.changes = list(_leaf_changes(changes))
+
+    def page_count(self):
+        return max(1, -(-len(self.changes) // self.page_size))
+
+    def page(self, number):
+        """Return the text of a page
+
+        It has two header lines followed by a line for each change;
+        change ``i`` of the page has index ``number * page_size + i``.
+
+        """
+        start = number * self.page_size
+        changes = self.changes[start:start + self.page_size]
+        lines = ['%s (changes %s-%s of %s)' %
+                 (self.description, min(start + 1, len(self.changes)),
+                  start + len(changes), len(self.changes)), '']
+        for index in range(start, start + len(changes)):
+            lines.append(self.summary(index))
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, index):
+        change = self.changes[index]
+        if isinstance(change, rope.base.change.ChangeContents):
+            old, new = _contents(change)
+            matcher = difflib.SequenceMatcher(None, old.splitlines(True),
+                                              new.splitlines(True))
+            hunks = len(list(matcher.get_grouped_opcodes()))
+            return '* %s: %s hunk%s' % (change.resource.path, hunks,
+                                        's'[hunks == 1:])
+        return '* ' + ' '.join(str(change).split())
+
+    def diff(self, index):
+        return str(self.changes[index].get_description())
+
+
+def _leaf_changes(changes):
+    if isinstance(changes, rope.base.change.ChangeSet):
+        for change in changes.changes:
+            for leaf in _leaf_changes(change):
+                yield leaf
+    else:
+        yield changes
+
+
+def _contents(change):
+    old = change.old_contents
+    if old is None:
+        if change.resource.exists():
+            old = change.resource.read()
+        else:
+            old = ''
+    return old, change.new_contents
+
+
+class _Speculation(object):
+    """Calculate the changes of a refactoring in a thread
+
+    The dialog of a refactoring mostly waits for the user; meanwhile
+    the changes for the `answers` given so far are calculated.  Rope
+    objects must not be used by other code until it is cancelled or
+    has been waited for; saving a file or running a command cancels
+    it, so that the changes are calculated again.
+
+    """
+
+    def __init__(self, calculate, answers, values):
+        self.answers = answers
+        self.handle = taskhandle.TaskHandle(name='Speculation')
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run,
+                                       args=(calculate, dict(values)))
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _run(self, calculate, values):
+        try:
+            self.result = calculate(values, self.handle)
+        except Exception:
+            self.error = sys.exc_info()
+
+    def cancel(self):
+        self.handle.stop()
+        self.thread.join()
+
+    def wait(self, handle):
+        """Return the changes, reporting progress through `handle`"""
+        job_set = handle.create_jobset('Calculating changes', 100)
+        done = 0
+        try:
+            while self.thread.isAlive():
+                self.thread.join(0.1)
+                job_set.check_status()
+                current = self.handle.current_jobset()
+                if current is not None:
+                    percent = current.get_percent_done() or 0
+                    while done < percent:
+                        job_set.finished_job()
+                        done += 1
+        except:
+            self.cancel()
+            raise
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.result
+
+
+def runtask(env, command, name, interrupts=True, deadline=None):
+    return RunTask(env, command, name, interrupts, deadline)()
+
+# ``(name, seconds, items)`` of the last tasks run by `RunTask`
+task_log = deque(maxlen=20)
 
 class RunTask(object):
+    """Run `task` with a `TaskHandle` and report its progress
+
+    If `interrupts` is true, the task is stopped when the user quits
+    or when it runs longer than `deadline` seconds (defaults to the
+    `task_deadline` setting).  Stopped tasks raise
+    `InterruptedTaskError` after reporting how long they ran.
 
-    def __init__(self, env, task, name, interrupts=True):
+    Progress is shown at most every `interval` seconds and only when
+    it has advanced by `step` percent, since each update is a round
+    trip to the editor.  Quits are noticed during these updates.
+
+    """
+
+    interval = 0.2
+    step = 1
+
+    def __init__(self, env, task, name, interrupts=True, deadline=None):
         self.env = env
         self.task = task
         self.name = name
         self.interrupts = interrupts
+        if deadline is None and interrupts:
+            deadline = env.get('task_deadline')
+        self.deadline = deadline
 
     def __call__(self):
-        handle = taskhandle.TaskHandle(name=self.name)
+        handle = taskhandle.TaskHandle(name=self.name,
+                                       interrupts=self.interrupts)
         progress = self.env.create_progress(self.name)
+        start = time.time()
+        shown = [start, 0]
         def update_progress():
+            if handle.is_stopped():
+                return
+            now = time.time()
+            if self.deadline and now - start > self.deadline:
+                handle.stop()
+                return
             jobset = handle.current_jobset()
             if jobset:
                 percent = jobset.get_percent_done()
-                if percent is not None:
-                    progress.update(percent)
+                if percent is None or now - shown[0] < self.interval or \
+                   abs(percent - shown[1]) < self.step:
+                    return
+                shown[:] = [now, percent]
+                try:
+                    progress.update(percent, _items(handle) / (now - start))
+                except KeyboardInterrupt:
+                    handle.stop()
         handle.add_observer(update_progress)
-        result = self.task(handle)
+        try:
+            try:
+                try:
+                    result = self.task(handle)
+                except KeyboardInterrupt:
+                    if not self.interrupts:
+                        raise
+                    raise exceptions.InterruptedTaskError(
+                        'Task <%s> was interrupted' % self.name)
+            finally:
+                task_log.append((self.name, time.time() - start,
+                                 _items(handle)))
+        except exceptions.InterruptedTaskError:
+            self.env.message('%s interrupted after %.1f seconds' %
+                             (self.name, time.time() - start))
+            raise
         progress.done()
         return result
+
+
+def _items(handle):
+    return sum(jobset.done for jobset in handle.get_jobsets())
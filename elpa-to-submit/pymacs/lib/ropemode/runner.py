@@ -0,0 +1,123 @@
+import codecs
+import io
+import os
+import socket
+import tempfile
+from collections import deque
+
+import rope.base.oi.doa
+
+
+class ModuleRuns(object):
+    """Run modules and perform dynamic object analysis in the background
+
+    At most `limit` modules run at the same time; the others wait in
+    order.  `poll()` should be called every now and then to pass the
+    output of the modules to `output(resource, text)` and to apply the
+    information collected by the modules that have exited.
+
+    """
+
+    def __init__(self, output, limit=1):
+        self.output = output
+        self.limit = limit
+        self.running = []
+        self.waiting = deque()
+
+    def run(self, project, resource):
+        self.waiting.append(_Run(project, resource))
+        self._start()
+
+    def poll(self):
+        """Return `True` if some modules have not finished yet"""
+        for run in list(self.running):
+            exited = run.exited()
+            self._read(run, exited)
+            if exited:
+                run.finish()
+                self.running.remove(run)
+        self._start()
+        return bool(self.running)
+
+    def stop(self, project=None):
+        """Kill the runs of `project` or of all projects"""
+        self.waiting = deque(run for run in self.waiting
+                             if project not in (None, run.project))
+        for run in list(self.running):
+            if project in (None, run.project):
+                run.kill()
+                self.running.remove(run)
+
+    def _start(self):
+        while self.waiting and len(self.running) < max(1, self.limit):
+            run = self.waiting.popleft()
+            run.start()
+            self.running.append(run)
+
+    def _read(self, run, final=False):
+        text = run.read(final)
+        if text:
+            self.output(run.resource, text)
+
+
+class _Run(object):
+
+    def __init__(self, project, resource):
+        self.project = project
+        self.resource = resource
+        self.data = []
+
+    def start(self):
+        prefs = self.project.prefs
+        receiver = None
+        if prefs.get('perform_doa', prefs.get('perform_doi', True)):
+            # the data is received in a thread; it is applied in `finish()`
+            receiver = self.data.append
+        # the helper's stdin carries the Pymacs protocol
+        self.stdin = open(os.devnull)
+        self.stdout = tempfile.NamedTemporaryFile(prefix='rope-run-')
+        self.reader = io.open(self.stdout.name, 'rb')
+        # characters may be split between reads
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.runner = rope.base.oi.doa.PythonFileRunner(
+            self.project.pycore, self.resource, stdin=self.stdin,
+            stdout=self.stdout, analyze_data=receiver)
+        self.runner.run()
+
+    def exited(self):
+        return self.runner.process.poll() is not None
+
+    def read(self, final=False):
+        return self.decoder.decode(self.reader.read(), final)
+
+    def finish(self):
+        self.runner.process.wait()
+        receiving = getattr(self.runner, 'receiving_thread', None)
+        if receiving is not None:
+            receiving.join(0.5)
+            if receiving.isAlive():
+                self._stop_receiving()
+                receiving.join(0.5)
+        object_info = self.project.pycore.object_info
+        for data in list(self.data):
+            object_info.doa_data_received(data)
+        self.project.pycore.module_cache.forget_all_data()
+        self._close()
+
+    def kill(self):
+        self.runner.kill_process()
+        self._close()
+
+    def _stop_receiving(self):
+        # the receiver waits in `accept()` if the module exited before
+        # connecting to it; connecting lets it see the end of the data
+        try:
+            port = int(self.runner.receiver.get_send_info())
+            socket.create_connection(('127.0.0.1', port), 1).close()
+        except (ValueError, socket.error):
+            pass
+
+    def _close(self):
+        self.stdin.close()
+        self.reader.close()
+        self.stdout.close()
@@ -0,0 +1,80 @@
+import heapq
+
+from rope.base import exceptions, pynames
+
+
+class AnalysisScheduler(object):
+    """Perform static object analysis on modules while Emacs is idle
+
+    The most recently edited module comes first and is followed by the
+    project modules it imports.  `run()` analyzes one module at a time
+    and stops as soon as the user does something.  The imports of an
+    edited module are found when it is analyzed, so `edited()` stays
+    cheap enough for save hooks.
+
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.pending = {}
+        self.heap = []
+        self.clock = 0
+        self.edits = set()
+
+    def edited(self, resource):
+        """Queue `resource` and, later, the project modules it imports"""
+        self._push(resource)
+        self.edits.add(resource)
+
+    def run(self, should_stop):
+        """Analyze queued modules until `should_stop()` returns `True`
+
+        Returns the number of modules analyzed.
+
+        """
+        count = 0
+        while self.pending and not should_stop():
+            resource = self._pop()
+            if not resource.exists():
+                self.edits.discard(resource)
+                continue
+            self.project.pycore.analyze_module(resource)
+            count += 1
+            if resource in self.edits:
+                self.edits.discard(resource)
+                for imported in self._imports(resource):
+                    self._push(imported)
+        return count
+
+    def _push(self, resource):
+        self.clock += 1
+        self.pending[resource] = self.clock
+        heapq.heappush(self.heap, (-self.clock, resource))
+
+    def _pop(self):
+        while True:
+            priority, resource = heapq.heappop(self.heap)
+            if self.pending.get(resource) == -priority:
+                del self.pending[resource]
+                return resource
+
+    def _imports(self, resource):
+        try:
+            pymodule = self.project.pycore.resource_to_pyobject(resource)
+        except exceptions.ModuleSyntaxError:
+            return []
+        result = []
+        for pyname in pymodule.get_attributes().values():
+            if isinstance(pyname, pynames.ImportedName):
+                pyname = pyname.imported_module
+            if not isinstance(pyname, pynames.ImportedModule):
+                continue
+            get_resource = getattr(pyname.get_object(), 'get_resource', None)
+            if get_resource is None:
+                continue
+            imported = get_resource()
+            if imported is not None and imported != resource and \
+               imported.project is self.project and \
+               self.project.pycore.is_python_file(imported):
+                result.append(imported)
+        return result
@@ -0,0 +1,94 @@
+import os
+import re
+
+from rope.base import resourceobserver
+
+
+class IdentifierIndex(object):
+    """Map identifiers to the python files they appear in
+
+    Rope only finds occurrences of a name in files containing it
+    textually, so searches and renames can skip the other files.  The
+    index is saved in the project's rope folder.  Files are reindexed
+    when rope reports them changed and, on use, when their
+    modification time differs from the one saved.
+
+    """
+
+    _identifier = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+    def __init__(self, project):
+        self.project = project
+        self.files = project.data_files.read_data('identifiers') or {}
+        self.inverted = {}
+        for path, (stamp, names) in self.files.items():
+            self._add(path, names)
+        observer = resourceobserver.ResourceObserver(
+            changed=self._changed, moved=self._moved, removed=self._removed)
+        project.add_observer(observer)
+        project.data_files.add_write_hook(self._write)
+
+    def resources(self, name, resources=None):
+        """Return the `resources` that contain `name`
+
+        If `resources` is `None`, all python files are searched.
+
+        """
+        all_files = self.project.pycore.get_python_files()
+        self._update(all_files)
+        if resources is None:
+            resources = all_files
+        paths = self.inverted.get(name, ())
+        return [resource for resource in resources if resource.path in paths]
+
+    def _update(self, resources):
+        for resource in resources:
+            try:
+                stamp = os.path.getmtime(resource.real_path)
+            except OSError:
+                continue
+            if resource.path not in self.files or \
+               self.files[resource.path][0] != stamp:
+                self._index(resource, stamp)
+
+    def _index(self, resource, stamp=None):
+        if stamp is None:
+            stamp = os.path.getmtime(resource.real_path)
+        self._forget(resource.path)
+        names = list(set(self._identifier.findall(resource.read())))
+        self.files[resource.path] = (stamp, names)
+        self._add(resource.path, names)
+
+    def _add(self, path, names):
+        for name in names:
+            self.inverted.setdefault(name, set()).add(path)
+
+    def _forget(self, path):
+        if path in self.files:
+            for name in self.files.pop(path)[1]:
+                paths = self.inverted.get(name)
+                if paths is not None:
+                    paths.discard(path)
+                    if not paths:
+                        del self.inverted[name]
+
+    def _changed(self, resource):
+        if not resource.is_folder() and \
+           self.project.pycore.is_python_file(resource):
+            self._index(resource)
+
+    def _moved(self, resource, new_resource):
+        self._removed(resource)
+        self._changed(new_resource)
+
+    def _removed(self, resource):
+        if resource.is_folder():
+            prefix = resource.path + '/'
+            for path in [path for path in self.files
+                         if path.startswith(prefix)]:
+                self._forget(path)
+        else:
+            self._forget(resource.path)
+
+    def _write(self):
+        self.project.data_files.write_data('identifiers', self.files)
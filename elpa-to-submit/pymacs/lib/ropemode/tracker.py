@@ -0,0 +1,221 @@
+"""Finding the files of a project changed outside rope
+
+`Project.validate(project.root)` makes rope check every resource it
+knows about.  A tracker remembers the state of the project tree and
+validates only the files and folders changed since its last call.  It
+uses inotify when pyinotify is installed.  Polling modification times
+stats the whole tree, which is slower than validating it for most
+projects; it is used only when asked for.
+
+"""
+import fnmatch
+import os
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+def create_tracker(project, poll=False):
+    """Return a tracker for `project` or `None` if none can be used"""
+    if pyinotify is not None:
+        try:
+            return InotifyTracker(project)
+        except (OSError, pyinotify.WatchManagerError):
+            pass
+    if poll:
+        return PollingTracker(project)
+
+
+class ChangeTracker(object):
+
+    def __init__(self, project):
+        self.project = project
+        self.ignored = [pattern for pattern in
+                        project.prefs.get('ignored_resources', [])
+                        if '/' not in pattern]
+
+    def validate(self):
+        """Validate the parts of the project changed since the last call"""
+        paths = self.changed_paths()
+        if paths is None:
+            self.project.validate(self.project.root)
+            return
+        for resource in self._resources(paths):
+            self.project.validate(resource)
+
+    def changed_paths(self):
+        """Return changed paths or `None` if everything should be validated"""
+
+    def close(self):
+        pass
+
+    def _is_ignored(self, name):
+        for pattern in self.ignored:
+            if fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+    def _resources(self, paths):
+        root = self.project.root.real_path
+        ropefolder = self.project.ropefolder
+        if ropefolder is not None:
+            ropefolder = ropefolder.real_path + os.sep
+        # validating a folder validates its contents, too
+        result = {}
+        for path in sorted(set(paths)):
+            if ropefolder is not None and path.startswith(ropefolder):
+                continue
+            while path != root and not os.path.exists(path):
+                path = os.path.dirname(path)
+            relative = os.path.relpath(path, root)
+            if relative == os.curdir:
+                return [self.project.root]
+            if relative.startswith(os.pardir):
+                continue
+            relative = relative.replace(os.sep, '/')
+            parent = relative
+            while '/' in parent:
+                parent = parent.rsplit('/', 1)[0]
+                if parent in result:
+                    break
+            else:
+                result[relative] = True
+        return [self.project.get_resource(name) for name in sorted(result)]
+
+
+class PollingTracker(ChangeTracker):
+    """Compare modification times with a snapshot
+
+    Only folders whose modification time changed are listed again;
+    files are compared with a `stat()` each.
+
+    """
+
+    def __init__(self, project):
+        ChangeTracker.__init__(self, project)
+        self.folders = {}
+        self.files = {}
+        self._scan(project.root.real_path, [])
+
+    def changed_paths(self):
+        changed = []
+        self._poll(self.project.root.real_path, changed)
+        return changed
+
+    def _poll(self, path, changed):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._forget(path)
+            changed.append(path)
+            return
+        if path not in self.folders:
+            # its earlier scan failed
+            self._scan(path, changed)
+            return
+        stamp, files, folders = self.folders[path]
+        if mtime != stamp:
+            self._forget(path)
+            self._scan(path, changed)
+            return
+        for name in files:
+            child = os.path.join(path, name)
+            try:
+                mtime = os.stat(child).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self.files[child]:
+                self.files[child] = mtime
+                changed.append(child)
+        for name in folders:
+            self._poll(os.path.join(path, name), changed)
+
+    def _scan(self, path, changed):
+        try:
+            stamp = os.stat(path).st_mtime
+            names = os.listdir(path)
+        except OSError:
+            changed.append(path)
+            return
+        changed.append(path)
+        files = []
+        folders = []
+        for name in names:
+            if self._is_ignored(name):
+                continue
+            child = os.path.join(path, name)
+            if os.path.isdir(child):
+                if not os.path.islink(child):
+                    folders.append(name)
+            else:
+                try:
+                    self.files[child] = os.stat(child).st_mtime
+                except OSError:
+                    continue
+                files.append(name)
+        self.folders[path] = (stamp, files, folders)
+        for name in folders:
+            self._scan(os.path.join(path, name), [])
+
+    def _forget(self, path):
+        if path not in self.folders:
+            return
+        stamp, files, folders = self.folders.pop(path)
+        for name in files:
+            self.files.pop(os.path.join(path, name), None)
+        for name in folders:
+            self._forget(os.path.join(path, name))
+
+
+if pyinotify is not None:
+
+    class _Recorder(pyinotify.ProcessEvent):
+
+        def my_init(self, paths):
+            self.paths = paths
+            self.overflowed = False
+
+        def process_IN_Q_OVERFLOW(self, event):
+            self.overflowed = True
+
+        def process_default(self, event):
+            self.paths.append(event.pathname)
+
+
+class InotifyTracker(ChangeTracker):
+    """Collect the paths inotify reports as changed"""
+
+    mask = 0
+    if pyinotify is not None:
+        mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE |
+                pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM |
+                pyinotify.IN_MOVED_TO | pyinotify.IN_DELETE_SELF)
+
+    def __init__(self, project):
+        ChangeTracker.__init__(self, project)
+        self.paths = []
+        self.recorder = _Recorder(paths=self.paths)
+        manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(manager, self.recorder, timeout=0)
+        manager.add_watch(project.root.real_path, self.mask, rec=True,
+                          auto_add=True, quiet=False,
+                          exclude_filter=self._excluded)
+
+    def changed_paths(self):
+        while self.notifier.check_events():
+            self.notifier.read_events()
+            self.notifier.process_events()
+        paths = list(self.paths)
+        del self.paths[:]
+        if self.recorder.overflowed:
+            self.recorder.overflowed = False
+            return None
+        return paths
+
+    def close(self):
+        self.notifier.stop()
+
+    def _excluded(self, path):
+        return self._is_ignored(os.path.basename(path))
@@ -137,6 +137,8 @@ class Protocol:
         # A reply notification from Emacs interrupts the loop: the result
         # of this function is then the value returned from Emacs.
         done = False
+        interrupted = False
+        inhibit_quit = run.inhibit_quit
         while not done:
             try:
                 action, text = self.receive()
@@ -163,6 +165,13 @@ class Protocol:
                     finally:
                         run.inhibit_quit = True
                 elif action == 'raise':
+                    # Emacs could not serve a Python request.  When it
+                    # is because of a quit, unwind the Python side too
+                    # instead of bouncing the error back to Emacs.
+                    # `pymacs-interruptible-eval' reports quits with
+                    # this exact string; other errors may mention it.
+                    if text.strip().strip('"') == '*Interrupted!*':
+                        done = interrupted = True
                     action = 'raise'
                     value = 'Emacs: ' + text
                 else:
@@ -186,6 +195,10 @@ class Protocol:
                 fragments = []
                 print_lisp(value, fragments.append, True)
                 self.send(action, ''.join(fragments))
+        # Restore quit handling of the Python code that called Emacs.
+        run.inhibit_quit = inhibit_quit
+        if interrupted:
+            raise KeyboardInterrupt
         return value
 
     def receive(self):